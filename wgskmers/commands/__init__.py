@@ -4,13 +4,7 @@ import logging
 
 import click
 
-from .find import find_command
-from .config import config_group
-from .database import database_group
-from .genomes import genomes_group
-from .kmers import kmers_group
-from .query import query_command
-from .dev import dev_group
+from .util import LazyGroup
 
 
 # Configure logger for warnings and debug messeges
@@ -18,8 +12,28 @@ logging.basicConfig(format='%(levelname)s: %(message)s')
 logger = logging.getLogger()
 
 
+# Subcommands by name, as (module, attribute, short help) tuples. Modules are
+# only imported when the subcommand is actually used.
+lazy_subcommands = {
+	'find': ('wgskmers.commands.find', 'find_command',
+	         'Find k-mers in a file or set of files'),
+	'config': ('wgskmers.commands.config', 'config_group',
+	           'View and edit global configuration'),
+	'db': ('wgskmers.commands.database', 'database_group',
+	       'Manage databases'),
+	'gen': ('wgskmers.commands.genomes', 'genomes_group',
+	        'Manage reference genomes'),
+	'refs': ('wgskmers.commands.kmers', 'kmers_group',
+	         'Calculate and manage reference k-mer collections'),
+	'query': ('wgskmers.commands.query', 'query_command',
+	          'Query a sequence against the reference database'),
+	'dev': ('wgskmers.commands.dev', 'dev_group',
+	        'Developer commands'),
+}
+
+
 # Top-level cli group
-@click.group()
+@click.group(cls=LazyGroup, lazy_subcommands=lazy_subcommands)
 @click.option('--debug', is_flag=True, default=False,
               help='Print debug messages')
 @click.pass_context
@@ -30,12 +44,3 @@ def cli(ctx, debug=False):
 	# Debug mode
 	if debug:
 		logger.setLevel(logging.DEBUG)
-
-
-cli.add_command(find_command)
-cli.add_command(config_group)
-cli.add_command(database_group)
-cli.add_command(genomes_group)
-cli.add_command(kmers_group)
-cli.add_command(query_command)
-cli.add_command(dev_group)
@@ -1,20 +1,42 @@
 """Commands for managing registered databases"""
 
 import os
-import string
+import re
 
 import click
 
 from .util import choose_db_path
 
 
+# Valid database names - lower case alphanumeric or underscores
+valid_name_re = re.compile(r'[a-z0-9_]+\Z')
+
+
 def check_valid_name(name):
 	"""Raises a ClickException if the name is not a valid database name"""
-	if not set(string.lowercase + string.digits + '_').issuperset(name):
+	if valid_name_re.match(name) is None:
 		raise click.ClickException('Name characters must be alphanumeric or '
 		                           'underscores')
 
 
+def check_db_path(path):
+	"""Raises a ClickException if the path does not contain a database
+
+	Whether the path exists at all is only checked on failure, to pick the
+	error message.
+	"""
+	from wgskmers import database
+
+	if not database.is_db_directory(path):
+		if not os.path.exists(path):
+			raise click.ClickException('{} does not exist.'.format(path))
+		else:
+			raise click.ClickException(
+				'{} does not contain a database.'
+				.format(path)
+			)
+
+
 @click.group(name='db')
 def database_group():
 	"""Manage databases"""
@@ -36,15 +58,24 @@ def list():
 	current_path, method = database.get_current_db()
 
 	# List default database first, remaining alphabetically
-	databases = registered_dbs.items()
-	if default_db is not None:
-		databases.insert(0, (None, default_db))
+	databases = [(None, default_db)] if default_db is not None else []
+	databases.extend(sorted(registered_dbs.items()))
 
 	# None found
 	if not databases:
 		click.echo('No databases are currently registered', err=True)
 		return
 
+	# Check each path only once (default is often also registered by name)
+	db_paths = {path: database.is_db_directory(path) for name, path in databases}
+
+	# Styles for names and paths, as format strings so the ANSI codes are
+	# only built once
+	missing_name_fmt = click.style('{}', fg='red', bold=True)
+	missing_path_fmt = click.style('{}', fg='red')
+	current_name_fmt = click.style('{}', fg='cyan', bold=True)
+	default_name_fmt = click.style('{}', fg='green')
+
 	# Print names and paths
 	for name, path in databases:
 
@@ -55,18 +86,18 @@ def list():
 		print_name = print_name.ljust(20)
 
 		# Check if missing
-		if not database.is_db_directory(path):
-			name_str = click.style(print_name, fg='red', bold=True)
-			path_str = click.style(path, fg='red')
+		if not db_paths[path]:
+			name_str = missing_name_fmt.format(print_name)
+			path_str = missing_path_fmt.format(path)
 
 		else:
 			path_str = path
 
 			# Check if current
 			if current_path is not None and path == current_path:
-				name_str = click.style(print_name, fg='cyan', bold=True)
+				name_str = current_name_fmt.format(print_name)
 			elif name is None:
-				name_str = click.style(print_name, fg='green')
+				name_str = default_name_fmt.format(print_name)
 			else:
 				name_str = print_name
 
@@ -168,7 +199,7 @@ def init(directory, set_default=False, name=None):
 
 @database_group.command(short_help='Set the default database')
 @click.option('-n', '--name', help='Name of currently registered database')
-@click.argument('path', type=click.Path(exists=True), required=False)
+@click.argument('path', type=click.Path(), required=False)
 def set_default(path=None, name=None):
 	"""
 	Sets the default database by either specifying a path or giving the name
@@ -188,11 +219,7 @@ def set_default(path=None, name=None):
 		if name is not None:
 			raise click.ClickException('Can\'t give both name and path.')
 
-		if not database.is_db_directory(path):
-			raise click.ClickException(
-				'{} does not contain a database.'
-				.format(path)
-			)
+		check_db_path(path)
 
 	# Set from another registered database
 	elif name is not None:
@@ -233,7 +260,7 @@ def set_default(path=None, name=None):
 
 @database_group.command(short_help='Register a database by name')
 @click.argument('name', type=str)
-@click.argument('path', type=click.Path(exists=True), required=False)
+@click.argument('path', type=click.Path(), required=False)
 def register(name, path=None):
 	"""
 	Register an existing database in the global configuration file. If no
@@ -258,11 +285,7 @@ def register(name, path=None):
 	if path is not None:
 		path = os.path.abspath(path)
 
-		if not database.is_db_directory(path):
-			raise click.ClickException(
-				'{} does not contain a database.'
-				.format(path)
-			)
+		check_db_path(path)
 
 	else:
 		path = database.get_db_root(os.getcwd())
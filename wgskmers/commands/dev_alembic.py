@@ -0,0 +1,181 @@
+"""Alembic database migration commands for developers
+
+These are kept separate from the rest of the dev commands so that they are
+only loaded when actually used.
+"""
+
+from functools import wraps
+
+import click
+
+from .util import with_db, choose_db_path
+
+
+@click.group(name='alembic')
+def alembic_group():
+	"""Alembic database migration tools"""
+	pass
+
+
+def with_alembic_config(use_db=False):
+	"""Creates decorator for commands needing alembic config
+
+	Imports of the database/alembic modules are deferred until the command is
+	actually run, as this is called at import time for every alembic command.
+	"""
+
+	def decorator(func):
+
+		if use_db:
+			@wraps(func)
+			def wrapper(db_path, *args, **kwargs):
+				from wgskmers.database.upgrade import (get_alembic_config,
+					get_sqlite_path)
+				cfg = get_alembic_config(get_sqlite_path(db_path))
+				return func(cfg, *args, **kwargs)
+
+			return choose_db_path()(wrapper)
+
+		else:
+			@wraps(func)
+			def wrapper(*args, **kwargs):
+				from wgskmers.database.upgrade import get_alembic_config
+				cfg = get_alembic_config()
+				return func(cfg, *args, **kwargs)
+
+			return wrapper
+
+	return decorator
+
+
+@alembic_group.command()
+@with_db(choose=True)
+def diff(ctx, db):
+	"""Show database diff for current SQLA models"""
+
+	from pprint import pprint
+	from sqlalchemy.event import listen
+	from alembic.migration import MigrationContext
+	from alembic.autogenerate import compare_metadata
+	from wgskmers.database.models import Base
+	from wgskmers.database.sqla import set_sqlite_pragmas
+
+	engine = db.engine
+	listen(engine, 'connect', set_sqlite_pragmas)
+
+	mc = MigrationContext.configure(engine.connect())
+	diff = compare_metadata(mc, Base.metadata)
+
+	pprint(diff)
+
+
+@alembic_group.command()
+@click.option('--message', '-m', type=str,
+              help='Message string to use with revision')
+@click.option('--sql', is_flag=True,
+              help='Don\'t emit SQL to database - dump to standard output/file '
+                   'instead')
+@with_alembic_config()
+def revision(cfg, **kwargs):
+	"""Create a new revision file"""
+	from alembic import command as alembic_command
+	alembic_command.revision(cfg, **kwargs)
+
+
+@alembic_group.command()
+@click.option('--message', '-m', type=str,
+              help='Message string to use with revision')
+@click.option('--sql', is_flag=True,
+              help='Don\'t emit SQL to database - dump to standard output/file '
+                   'instead')
+@with_alembic_config(use_db=True)
+def auto_revision(cfg, **kwargs):
+	"""Create a new revision file"""
+	from alembic import command as alembic_command
+	alembic_command.revision(cfg, autogenerate=True, **kwargs)
+
+
+@alembic_group.command()
+@click.option('--verbose', '-v', is_flag=True, help='Use more verbose output')
+@with_alembic_config(use_db=True)
+def current(cfg, **kwargs):
+	"""Display the current revision for a database."""
+	from alembic import command as alembic_command
+	alembic_command.current(cfg, **kwargs)
+
+
+@alembic_group.command()
+@click.option('--resolve_dependencies', is_flag=True,
+	help='Treat dependency versions as down revisions')
+@click.option('--verbose', '-v', is_flag=True, help='Use more verbose output')
+@with_alembic_config()
+def heads(cfg, **kwargs):
+	"""Show current available heads in the script directory."""
+	from alembic import command as alembic_command
+	alembic_command.heads(cfg, **kwargs)
+
+
+@alembic_group.command()
+@click.option('--verbose', '-v', is_flag=True, help='Use more verbose output')
+@with_alembic_config()
+def branches(cfg, **kwargs):
+	"""Show current branch points."""
+	from alembic import command as alembic_command
+	alembic_command.branches(cfg, **kwargs)
+
+
+@alembic_group.command()
+@click.argument('rev')
+@with_alembic_config()
+def show(cfg, rev):
+	"""Show the revision(s) denoted by the given symbol."""
+	from alembic import command as alembic_command
+	alembic_command.show(cfg, rev)
+
+
+@alembic_group.command()
+@click.option('--sql', is_flag=True,
+              help='Don\'t emit SQL to database - dump to standard output/file '
+                   'instead')
+@click.option('--tag', type=str,
+              help='Arbitrary \'tag\' name - can be used by custom env.py '
+                   'scripts')
+@click.argument('revision')
+@with_alembic_config(use_db=True)
+def stamp(cfg, revision, **kwargs):
+	"""'stamp' the revision table with the given revision, don't run any
+	migrations.
+	"""
+	from alembic import command as alembic_command
+	alembic_command.stamp(cfg, revision, **kwargs)
+
+
+@alembic_group.command()
+@click.option('--sql', is_flag=True,
+              help='Don\'t emit SQL to database - dump to standard output/file '
+                   'instead')
+@click.option('--tag', type=str,
+              help='Arbitrary \'tag\' name - can be used by custom env.py '
+                   'scripts')
+@click.argument('revision')
+@with_alembic_config(use_db=True)
+def upgrade(cfg, revision, **kwargs):
+	"""Upgrade database to revision"""
+	from alembic import command as alembic_command
+	alembic_command.upgrade(cfg, revision, **kwargs)
+
+
+@alembic_group.command()
+@click.option('--sql', is_flag=True,
+              help='Don\'t emit SQL to database - dump to standard output/file '
+                   'instead')
+@click.option('--tag', type=str,
+              help='Arbitrary \'tag\' name - can be used by custom env.py '
+                   'scripts')
+@click.argument('revision')
+@with_alembic_config(use_db=True)
+def downgrade(cfg, revision, **kwargs):
+	"""Upgrade database to revision"""
+	from alembic import command as alembic_command
+	alembic_command.downgrade(cfg, revision, **kwargs)
+
@@ -6,10 +6,8 @@ By default, the script will output a sorted list of all k-mers found.
 import os
 import sys
 import logging
-from collections import Counter
 
 import click
-from tqdm import tqdm
 
 
 logger = logging.getLogger()
@@ -39,11 +37,13 @@ def kmers_from_records(records, spec, quality_threshold=None):
 			None or not.
 	"""
 
+	from wgskmers.kmers import seq_upper
+
 	# Parse file and iterate over sequences
 	for record in records:
 
 		# Upper case for search
-		seq = record.seq.upper()
+		seq = seq_upper(record.seq)
 
 		# No quality
 		if quality_threshold is None:
@@ -56,6 +56,142 @@ def kmers_from_records(records, spec, quality_threshold=None):
 			                        threshold=quality_threshold)
 
 
+def kmers_from_seqs(seqs, spec):
+	"""Generator yielding KmerFinders for a set of plain sequence strings.
+
+	Args:
+		seqs: iterable of str. Sequences to find k-mers in.
+		spec. KmerSpec. Spec defining k-mers to search for.
+
+	Yields:
+		KmerFinder.
+	"""
+	from wgskmers.kmers import seq_upper
+
+	for seq in seqs:
+		yield spec.find(seq_upper(seq), revcomp=True)
+
+
+def kmers_from_fastq_reads(reads, spec, quality_threshold, quality_offset):
+	"""Generator yielding QualityKmerFinders for FASTQ reads as plain strings.
+
+	Args:
+		reads: iterable of (str, str). Sequence and quality string of each
+			read, as yielded by wgskmers.parse.iter_fastq_reads.
+		spec. KmerSpec. Spec defining k-mers to search for.
+		quality_threshold: numeric. Filter out k-mers containing PHRED scores
+			below this value.
+		quality_offset: int. ASCII offset of quality scores in quality
+			strings.
+
+	Yields:
+		QualityKmerFinder.
+
+	Raises:
+		ValueError: if a quality string contains characters below the offset
+			(e.g. if the file's quality encoding was given incorrectly).
+	"""
+	import numpy as np
+	from wgskmers.kmers import seq_upper
+
+	for i, (seq, qual) in enumerate(reads):
+		# Signed type so characters below the offset don't wrap around
+		phred_scores = (np.frombuffer(qual, dtype=np.uint8).astype(np.int16) -
+		                quality_offset)
+
+		if phred_scores.size and phred_scores.min() < 0:
+			raise ValueError('Invalid character in quality string of read {}'
+			                 .format(i + 1))
+
+		yield spec.find_quality(seq_upper(seq), revcomp=True,
+		                        quality=phred_scores,
+		                        threshold=quality_threshold)
+
+
+def write_lines(stream, lines):
+	"""Write lines to output stream with a single call instead of one per line
+
+	Args:
+		stream: writeable stream. Stream to write to.
+		lines: list of str. Lines to write, without newline characters.
+	"""
+	if lines:
+		stream.write('\n'.join(lines))
+		stream.write('\n')
+
+
+def find_indices(finders):
+	"""Get indices of all k-mers found by a set of KmerFinders
+
+	Args:
+		finders: Iterable of KmerFinder. Finders yielding k-mers.
+
+	Returns:
+		tuple (np.ndarray, KmerSpec). Array of indices of all k-mers found
+			(including duplicates) and the KmerSpec of the finders. Indices
+			are np.uint32 if they fit, otherwise np.int64. Spec will be None
+			if there were no finders.
+	"""
+	import numpy as np
+
+	# Copy indices from each finder into a single buffer as they are found,
+	# growing it as needed. For files with many short sequences this avoids
+	# keeping a separate small array for each.
+	buf = None
+	n = 0
+
+	spec = None
+	for finder in finders:
+		spec = finder.spec
+		indices = finder.get_index_array()
+
+		# Use the narrowest type that fits the indices, halving the memory
+		# used (and sorted later) for the usual suffix lengths
+		if buf is None:
+			dtype = np.uint32 if spec.k_sfx <= 16 else np.int64
+			buf = np.empty(1024, dtype=dtype)
+
+		if n + len(indices) > len(buf):
+			new_buf = np.empty(max(2 * len(buf), n + len(indices)),
+			                   dtype=buf.dtype)
+			new_buf[:n] = buf[:n]
+			buf = new_buf
+
+		buf[n:n + len(indices)] = indices
+		n += len(indices)
+
+	if buf is None:
+		return np.empty(0, dtype=np.int64), spec
+
+	return buf[:n], spec
+
+
+def count_indices(indices, idx_len):
+	"""Get unique k-mer indices and the number of times each occurs
+
+	Equivalent to np.unique(indices, return_counts=True). When the number of
+	indices is large compared to the total number of possible k-mers, this
+	uses a counting sort (np.bincount), which is linear in the number of
+	indices instead of sorting them.
+
+	Args:
+		indices: np.ndarray. Array of k-mer indices, possibly with duplicates.
+		idx_len: int. Total number of possible k-mer indices.
+
+	Returns:
+		tuple (np.ndarray, np.ndarray). Sorted unique indices and their
+			counts.
+	"""
+	import numpy as np
+
+	if idx_len > 4 * len(indices):
+		return np.unique(indices, return_counts=True)
+
+	counts = np.bincount(indices, minlength=idx_len)
+	unique = np.flatnonzero(counts)
+	return unique, counts[unique]
+
+
 def write_kmer_list(stream, finders):
 	"""Write sorted list of unique k-mers to output stream
 
@@ -66,17 +202,26 @@ def write_kmer_list(stream, finders):
 	Returns:
 		int. Number of unique k-mers found.
 	"""
-	# Find unique k-mers
-	kmer_set = {k for f in finders for k in f.get_kmers()}
+	import numpy as np
+	from wgskmers.kmers import kmers_at_indices
 
-	# Sort them
-	kmers_sorted = sorted(kmer_set)
+	indices, spec = find_indices(finders)
+	if spec is None:
+		return 0
 
-	# Write
-	for kmer in kmers_sorted:
-		stream.write(kmer + '\n')
+	# Find unique k-mers. These are sorted, and the order of indices is the
+	# same as the alphabetical order of the k-mers.
+	unique = count_indices(indices, spec.idx_len)[0]
+
+	# Write k-mer characters plus newlines as a single block of bytes, without
+	# creating a string for each k-mer
+	kmers = kmers_at_indices(unique, spec.k_sfx)
+	lines = np.empty((len(unique), spec.k_sfx + 1), dtype=np.uint8)
+	lines[:, :-1] = kmers[:, None].view(np.uint8)
+	lines[:, -1] = ord('\n')
+	stream.write(lines.tostring())
 
-	return len(kmer_set)
+	return len(unique)
 
 
 def write_kmer_counts(stream, finders):
@@ -89,18 +234,25 @@ def write_kmer_counts(stream, finders):
 	Returns:
 		int. Number of unique k-mers found.
 	"""
+	import numpy as np
+	from wgskmers.kmers import kmers_at_indices
+
+	indices, spec = find_indices(finders)
+	if spec is None:
+		return 0
+
 	# Get k-mer counts
-	kmer_counts = Counter(k for f in finders for k in f.get_kmers())
+	unique, counts = count_indices(indices, spec.idx_len)
 
-	# Sort k-mers by count
-	kmers_sorted = sorted(kmer_counts.items(), key=lambda i: i[1],
-	                      reverse=True)
+	# Sort k-mers by count (stable, so ties stay in alphabetical order)
+	order = np.argsort(-counts, kind='mergesort')
+	kmers_sorted = kmers_at_indices(unique[order], spec.k_sfx)
 
 	# Write
-	for kmer, count in kmers_sorted:
-		stream.write('{} {}\n'.format(kmer, count))
+	write_lines(stream, ['{} {}'.format(kmer, count) for kmer, count
+	                     in zip(kmers_sorted.tolist(), counts[order].tolist())])
 
-	return len(kmer_counts)
+	return len(unique)
 
 
 def write_kmer_hist(stream, finders):
@@ -113,17 +265,26 @@ def write_kmer_hist(stream, finders):
 	Returns:
 		int. Number of unique k-mers found.
 	"""
+	import numpy as np
+
+	indices, spec = find_indices(finders)
+	if spec is None:
+		return 0
+
 	# Get k-mer counts
-	kmer_counts = Counter(k for f in finders for k in f.get_kmers())
+	unique, counts = count_indices(indices, spec.idx_len)
 
-	# Histogram of counts
-	counts_hist = Counter(kmer_counts.values())
+	# Histogram of counts. Counts are small positive integers, so tally them
+	# directly instead of sorting.
+	hist = np.bincount(counts)
+	hist_n = np.flatnonzero(hist)
+	hist_counts = hist[hist_n]
 
 	# Write
-	for n in sorted(counts_hist.keys()):
-		stream.write('{} {}\n'.format(n, counts_hist[n]))
+	write_lines(stream, ['{} {}'.format(n, n_count) for n, n_count
+	                     in zip(hist_n.tolist(), hist_counts.tolist())])
 
-	return len(kmer_counts)
+	return len(unique)
 
 
 def write_kmer_vec(stream, finders):
@@ -134,6 +295,9 @@ def write_kmer_vec(stream, finders):
 	if the k-kmer with the associated index was present in the input,
 	otherwise zero.
 
+	If the stream is a file opened for reading and writing, the vector is
+	memory-mapped onto it instead of being created in memory.
+
 	Args:
 		stream: writeable stream. Stream to write to.
 		finders: Iterable of KmerFinder. Finders yielding k-mers to write.
@@ -141,16 +305,176 @@ def write_kmer_vec(stream, finders):
 	Returns:
 		int. Number of unique k-mers found.
 	"""
-	# Have the first KmerFinder.bool_vec create the output array for us,
-	# afterwards re-use it so as to find the union.
-	vec = None
-	for finder in finders:
-		vec = finder.bool_vec(out=vec)
+	import numpy as np
+
+	indices, spec = find_indices(finders)
+	if spec is None:
+		return 0
+
+	# Map directly onto output file. Extending the file fills it with zeros
+	# without writing them, so only pages containing found k-mers are touched.
+	if isinstance(stream, file) and '+' in stream.mode:
+		stream.truncate(spec.idx_len)
+		vec = np.memmap(stream, dtype=np.bool, mode='r+',
+		                shape=(spec.idx_len,))
+		vec[indices] = True
+		vec.flush()
+
+		# Choose between sorting the indices and scanning the vector by
+		# density, as in count_indices(). Sparse vectors are counted without
+		# reading back the whole file.
+		if spec.idx_len > 4 * len(indices):
+			return len(np.unique(indices))
+		else:
+			return np.count_nonzero(vec)
+
+	# Set all found indices at once rather than taking the union of a
+	# separate vector for each finder
+	vec = np.zeros(spec.idx_len, dtype=np.bool)
+	vec[indices] = True
 
 	# Write to output
 	vec.tofile(stream)
 
-	return vec.sum()
+	return np.count_nonzero(vec)
+
+
+def process_file(file_info, dest_path, spec, output_format, threshold=None,
+                 show_progress=False):
+	"""Find k-mers in a single sequence file and write output
+
+	Args:
+		file_info: wgskmers.parse.SeqFileInfo. Sequence file to read.
+		dest_path: str|None. Path of file to write output to. If None output
+			will be written to stdout.
+		spec: KmerSpec. Spec defining k-mers to search for.
+		output_format: str. One of "list", "bool", "counts", or "hist".
+		threshold: numeric|None. If not None, filter out k-mers containing
+			PHRED scores below this value.
+		show_progress: bool. Show progress bar while parsing file.
+
+	Returns:
+		int. Number of unique k-mers found.
+	"""
+	from Bio import SeqIO
+	from tqdm import tqdm
+	from wgskmers.parse import (ProgressSeqParser, iter_fasta_seqs,
+		iter_fastq_reads, fastq_quality_offsets)
+	from wgskmers.util import iterator_empty, iter_prefetch
+
+	logger.debug('Processing source file {}'.format(file_info.path))
+
+	in_stream = None
+	prefetch = None
+
+	# Plain FASTA without quality, read sequences directly without creating
+	# SeqRecords
+	if threshold is None and file_info.seq_format == 'fasta':
+		in_stream = open(file_info.path)
+		seqs = prefetch = iter_prefetch(iter_fasta_seqs(in_stream))
+
+		if show_progress:
+			seqs = tqdm(seqs, unit=' seqs', leave=False)
+
+		finders = kmers_from_seqs(seqs, spec)
+
+	# FASTQ with PHRED scores, also read directly
+	elif file_info.seq_format in fastq_quality_offsets:
+		in_stream = open(file_info.path)
+		reads = prefetch = iter_prefetch(iter_fastq_reads(in_stream),
+		                                 size_func=lambda read: len(read[0]))
+
+		if show_progress:
+			reads = tqdm(reads, unit=' seqs', leave=False)
+
+		if threshold is not None:
+			offset = fastq_quality_offsets[file_info.seq_format]
+			finders = kmers_from_fastq_reads(reads, spec, threshold, offset)
+		else:
+			finders = kmers_from_seqs((seq for seq, qual in reads), spec)
+
+	else:
+
+		# Wrap parse iterator in progress bar
+		if show_progress:
+			records = ProgressSeqParser(file_info.path,
+			                            fmt=file_info.seq_format, leave=False)
+		else:
+			records = SeqIO.parse(file_info.path, file_info.seq_format)
+
+		# Find the k-mers with quality info
+		if threshold is not None:
+			finders = kmers_from_records(records, spec,
+			                             quality_threshold=threshold)
+
+		else:
+			# Just the k-mers themselves
+			finders = kmers_from_records(records, spec)
+
+	# Check any sequences actually found
+	finders, no_seqs = iterator_empty(finders)
+	if no_seqs:
+		logger.warn('No sequences found in {}, bad file format?'
+		            .format(file_info.path))
+
+	# Output stream - file (text/binary), stdout, or StringIO for the pager
+	use_pager = False
+	if dest_path is None:
+		stdout = click.get_binary_stream('stdout')
+
+		# Page text output to a terminal, otherwise stream it directly
+		if stdout.isatty() and output_format in ('list', 'counts'):
+			from cStringIO import StringIO
+			out_stream = StringIO()
+			use_pager = True
+		else:
+			out_stream = stdout
+
+	elif output_format == 'bool':
+		# Read/write so write_kmer_vec() can memory-map it
+		out_stream = open(dest_path, 'w+b')
+	else:
+		out_stream = open(dest_path, 'w')
+
+	# Write output in try block because we can't use a with statement here
+	try:
+
+		# Output based on arguments
+		if output_format == 'list':
+			count = write_kmer_list(out_stream, finders)
+		elif output_format == 'bool':
+			count = write_kmer_vec(out_stream, finders)
+		elif output_format == 'counts':
+			count = write_kmer_counts(out_stream, finders)
+		elif output_format == 'hist':
+			count = write_kmer_hist(out_stream, finders)
+		else:
+			assert False, 'You shouldn\'t be here...'
+
+		logger.debug('Found {} unique k-mers'.format(count))
+
+		# Show in pager
+		if use_pager:
+			click.echo_via_pager(out_stream.getvalue())
+		elif dest_path is None:
+			out_stream.flush()
+
+	finally:
+		# Close file handles (but leave stdout open)
+		if dest_path is not None or use_pager:
+			out_stream.close()
+		# Stop the read-ahead thread before closing the file it reads from
+		if prefetch is not None:
+			prefetch.close()
+		if in_stream is not None:
+			in_stream.close()
+
+	return count
+
+
+def _process_file_job(args):
+	"""Calls process_file() with tuple of arguments, for use with Pool.imap"""
+	return process_file(*args)
 
 
 def make_dest_path(src_path, dest_dir, ext='.txt'):
@@ -192,6 +516,9 @@ def make_dest_path(src_path, dest_dir, ext='.txt'):
 	help='File format, as argument to Bio.SeqIO.parse. If omitted, will infer '
 	     'from extensions.')
 @click.option('-b', '--batch', is_flag=True, help='Run in batch mode.')
+@click.option('-j', '--jobs', type=int,
+	help='Number of files to process in parallel in batch mode. Defaults to '
+	     'the number of CPUs.')
 @click.option('-o', '--overwrite', is_flag=True,
 	help='Overwrite existing output files')
 
@@ -211,10 +538,9 @@ def find_command(src, dest, prefix, k, **kwargs):
 	in directory given by [DEST].
 	"""
 
-	from Bio import SeqIO
+	from tqdm import tqdm
 	from wgskmers.kmers import KmerSpec, nucleotides
-	from wgskmers.parse import ProgressSeqParser, find_seq_files, SeqFileInfo
-	from wgskmers.util import iterator_empty
+	from wgskmers.parse import find_seq_files, SeqFileInfo
 
 	show_progress = kwargs.pop('progress', False)
 	output_format = kwargs.pop('output_format', 'list')
@@ -222,6 +548,7 @@ def find_command(src, dest, prefix, k, **kwargs):
 	batch_mode = kwargs.pop('batch', False)
 	file_format = kwargs.pop('format', None)
 	overwrite_output = kwargs.pop('overwrite', False)
+	n_jobs = kwargs.pop('jobs', None)
 
 	# Check prefix valid
 	prefix = prefix.upper()
@@ -232,6 +559,10 @@ def find_command(src, dest, prefix, k, **kwargs):
 	if k <= 0:
 		raise ValueError('K must be positive')
 
+	# K-mer indices are calculated as 64-bit integers
+	if k - len(prefix) > 31:
+		raise ValueError('K can be at most 31 more than length of prefix')
+
 	# Kmer spec
 	spec = KmerSpec(k, prefix)
 
@@ -254,6 +585,10 @@ def find_command(src, dest, prefix, k, **kwargs):
 	if threshold is not None:
 		out_ext = '-t{}'.format(threshold) + out_ext
 
+	# Check number of jobs
+	if n_jobs is not None and n_jobs <= 0:
+		raise ValueError('Number of jobs must be positive')
+
 	# Batch mode
 	if batch_mode:
 
@@ -262,7 +597,7 @@ def find_command(src, dest, prefix, k, **kwargs):
 			raise ValueError('Must give destination directory in batch mode')
 
 		# Find files in source directory (raises OSError if doesn't exist)
-		files_info = find_seq_files(src, check_ext=True, filter_contents=True,
+		files_info = find_seq_files(src, filter_ext=True, filter_contents=True,
 		                            warn_contents=True)
 		if not files_info:
 			raise RuntimeError('No files found in {}'.format(src))
@@ -305,16 +640,9 @@ def find_command(src, dest, prefix, k, **kwargs):
 		else:
 			dest_paths = [None]
 
-	# Should be ok, loop over the files
-	files_info = zip(files_info, dest_paths)
-	if batch_mode and show_progress:
-		paths_iter = tqdm(paths_iter, unit='files', leave=False)
-
-	for file_info, dest_path in files_info:
-		
-		logger.debug('Processing source file {}'.format(info.path))
-
-		# Check if output file exists
+	# Check for existing output files
+	jobs = []
+	for file_info, dest_path in zip(files_info, dest_paths):
 		if dest_path is not None and os.path.exists(dest_path):
 			if overwrite_output:
 				logger.warn('Overwriting output file {}'.format(dest_path))
@@ -322,61 +650,36 @@ def find_command(src, dest, prefix, k, **kwargs):
 				logger.warn('Refusing to overwrite {}'.format(dest_path))
 				continue
 
-		# Wrap parse iterator in progress bar
-		if show_progress:
-			records = ProgressSeqParser(info.path, fmt=info.seq_format,
-			                            leave=False)
-		else:
-			records = SeqIO.parse(info.path, info.seq_format)
-
-		# Find the k-mers with quality info
-		if threshold is not None:
-			finders = kmers_from_records(records, spec,
-			                             quality_threshold=threshold)
+		jobs.append((file_info, dest_path, spec, output_format, threshold))
 
-		else:
-			# Just the k-mers themselves
-			finders = kmers_from_records(records, spec)
+	# Process files in parallel
+	if batch_mode and n_jobs != 1 and len(jobs) > 1:
+		import multiprocessing as mp
 
-		# Check any sequences actually found
-		finders, no_seqs = iterator_empty(finders)
-		if no_seqs:
-			logger.warn('No sequences found in {}, bad file format?'
-			            .format(info.path))
-
-		# Output stream - file (text/binary) or StringIO
-		if dest_path is None:
-			from cStringIO import StringIO
-			out_stream = StringIO()
-		elif output_format == 'bool':
-			out_stream = open(dest_path, 'wb')
-		else:
-			out_stream = open(dest_path, 'w')
+		# No point in starting more processes than there are files
+		if n_jobs is None:
+			n_jobs = mp.cpu_count()
+		pool = mp.Pool(processes=min(n_jobs, len(jobs)))
 
-		# Write output in try block because we can't use a with statement here
 		try:
+			results = pool.imap_unordered(_process_file_job, jobs)
+			if show_progress:
+				results = tqdm(results, total=len(jobs), unit='files',
+				               leave=False)
 
-			# Output based on arguments
-			if output_format == 'list':
-				count = write_kmer_list(out_stream, finders)
-			elif output_format == 'bool':
-				count = write_kmer_vec(out_stream, finders)
-			elif output_format == 'counts':
-				count = write_kmer_counts(out_stream, finders)
-			elif output_format == 'hist':
-				count = write_kmer_hist(out_stream, finders)
-			else:
-				assert False, 'You shouldn\'t be here...'
-
-			logger.debug('Found {} unique k-mers'.format(count))
+			for count in results:
+				pass
 
-			# Write to stdout
-			if dest_path is None:
-				if output_format == 'hist':
-					click.echo(out_stream.getvalue())
-				else:
-					click.echo_via_pager(out_stream.getvalue())
+			pool.close()
+			pool.join()
 
 		finally:
-			# Close file handle
-			out_stream.close()
+			pool.terminate()
+
+	# Process files one at a time
+	else:
+		if batch_mode and show_progress:
+			jobs = tqdm(jobs, unit='files', leave=False)
+
+		for job in jobs:
+			process_file(*job, show_progress=show_progress)
@@ -2,12 +2,12 @@
 
 import os
 import re
+import json
 from collections import OrderedDict, namedtuple
 from textwrap import dedent
-from csv import DictWriter, DictReader
+from csv import DictWriter, reader as csv_reader
 
 import click
-from tqdm import tqdm
 
 from .util import choose_db, with_db
 
@@ -39,13 +39,41 @@ def import_str(obj, lower=False):
 		return None
 
 
+def fasta_has_header(fh, block_size=1 << 20):
+	"""Checks if FASTA file has another header after the current position
+
+	Searches the file in large blocks instead of line by line, and stops at
+	the first header found. Should be called at the start of a line.
+
+	Args:
+		fh: file-like object. FASTA file opened in binary mode.
+		block_size: int. Number of bytes to read at a time.
+
+	Returns:
+		bool.
+	"""
+	line_start = True
+
+	while True:
+		block = fh.read(block_size)
+		if not block:
+			return False
+
+		if (line_start and block.startswith('>')) or '\n>' in block:
+			return True
+
+		line_start = block.endswith('\n')
+
+
 def guess_fasta_attrs(info):
 	from wgskmers.genbank import extract_acc
 
 	assert info.seq_format == 'fasta'
 	attrs = dict(file_format='fasta')
 
-	with info.open() as fh:
+	# Binary mode, headers are matched as raw bytes without any newline
+	# translation
+	with info.open('rb') as fh:
 
 		# Get first line, should be header
 		# (otherwise, not much we can do...)
@@ -62,14 +90,8 @@ def guess_fasta_attrs(info):
 
 			# Check to see if other headers present
 			# If so, attributes guessed from the first likely differ
-			for line in fh:
-				if line.startswith('>'):
-					attrs['is_assembled'] = False
-					break
-
-			else:
-				attrs['is_assembled'] = True
-
+			attrs['is_assembled'] = not fasta_has_header(fh)
+			if attrs['is_assembled']:
 				if match is not None:
 					attrs['gb_acc'] = acc.strip()
 
@@ -91,6 +113,101 @@ def guess_fasta_attrs(info):
 	return attrs
 
 
+# File in cache directory storing results of guess_fasta_attrs()
+fasta_attrs_cache_file = 'fasta_attrs.json'
+
+# Encoding of byte strings (paths, descriptions) in the cache file. Latin-1
+# maps every byte to a character, so strings which aren't valid UTF-8 can be
+# stored and are decoded back to exactly the same byte strings.
+fasta_attrs_cache_encoding = 'latin-1'
+
+
+def load_fasta_attrs_cache():
+	"""Loads cached results of guess_fasta_attrs() from previous runs
+
+	Returns:
+		dict. Cached attributes keyed by fasta_attrs_cache_key(). Empty if
+			the cache file is missing or unreadable.
+	"""
+	from wgskmers.config import cache_dir
+
+	try:
+		with open(os.path.join(cache_dir, fasta_attrs_cache_file)) as fh:
+			cache = json.load(fh)
+	except (IOError, ValueError):
+		return dict()
+
+	# JSON strings load as unicode, convert back to byte strings so keys
+	# compare equal to those from fasta_attrs_cache_key()
+	def to_bytes(val):
+		if isinstance(val, unicode):
+			return val.encode(fasta_attrs_cache_encoding)
+		return val
+
+	return {to_bytes(key): {name: to_bytes(val)
+	                        for name, val in attrs.iteritems()}
+	        for key, attrs in cache.iteritems()}
+
+
+def save_fasta_attrs_cache(cache, current_keys=()):
+	"""Saves results of guess_fasta_attrs() for future runs
+
+	Entries for files which no longer exist are dropped, as are outdated
+	entries for files seen in the current run. The file is written to a
+	temporary file first and then moved into place, so that concurrent runs
+	never see (or produce) a partially written cache.
+
+	Args:
+		cache: dict. Cached attributes keyed by fasta_attrs_cache_key().
+		current_keys: iterable. Keys of files seen in the current run.
+	"""
+	from tempfile import NamedTemporaryFile
+	from wgskmers.config import cache_dir
+
+	current_keys = set(current_keys)
+	current_paths = set(map(fasta_attrs_cache_key_path, current_keys))
+
+	pruned = dict()
+	for key, attrs in cache.iteritems():
+		path = fasta_attrs_cache_key_path(key)
+		if key in current_keys or \
+				(path not in current_paths and os.path.isfile(path)):
+			pruned[key] = attrs
+
+	cache_path = os.path.join(cache_dir, fasta_attrs_cache_file)
+	tmp_path = None
+
+	try:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+
+		with NamedTemporaryFile(dir=cache_dir, prefix=fasta_attrs_cache_file,
+		                        suffix='.tmp', delete=False) as fh:
+			tmp_path = fh.name
+			json.dump(pruned, fh, encoding=fasta_attrs_cache_encoding)
+
+		# Can't rename over an existing file on Windows
+		if os.name == 'nt' and os.path.exists(cache_path):
+			os.remove(cache_path)
+
+		os.rename(tmp_path, cache_path)
+
+	except (IOError, OSError, ValueError):
+		if tmp_path is not None and os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
+
+def fasta_attrs_cache_key(info):
+	"""Key for file in guess_fasta_attrs() cache, changes if file modified"""
+	stat = os.stat(info.abspath)
+	return '{}:{!r}:{}'.format(info.abspath, stat.st_mtime, stat.st_size)
+
+
+def fasta_attrs_cache_key_path(key):
+	"""Gets the file path from a key created by fasta_attrs_cache_key()"""
+	return key.rsplit(':', 2)[0]
+
+
 genome_import_attrs = OrderedDict([
 	('description', import_str),
 	('gb_db', import_str),
@@ -114,34 +231,61 @@ genome_import_cols.append('file')
 genome_import_cols.append('compression')
 
 
+# Buffer size for reading/writing import files
+import_csv_bufsize = 1 << 20
+
+
 ImportFileItem = namedtuple('ImportFileItem', ['path', 'compression', 'attrs'])
 
 def parse_import_csv(fh, db):
+	"""Parses genome import file into a list of ImportFileItems
+
+	All rows are validated before anything is returned, so that errors in the
+	file are found before anything is imported.
+	"""
 	from wgskmers.database.models import Genome
 
 	session = db.get_session()
 
+	rows = []
 	return_vals = []
 	uq_vals = dict()
 
 	# Read in template file
 
-	reader = DictReader(fh)
+	reader = csv_reader(fh)
+	header = next(reader, [])
 
 	# Check missing columns
-	missing_cols = set(genome_import_cols).difference(reader.fieldnames)
+	missing_cols = set(genome_import_cols).difference(header)
 	if missing_cols:
 		raise click.ClickException(
 			'Missing column "{}" in import file'
 			.format(missing_cols.pop())
 		)
 
+	# Look up row values by position rather than creating a dict for each row
+	col_indices = {name: i for i, name in enumerate(header)}
+	file_idx = col_indices['file']
+	compression_idx = col_indices['compression']
+	attr_converters = [(attrname, col_indices[attrname], converter)
+	                   for attrname, converter
+	                   in genome_import_attrs.iteritems()]
+
 	for i, row in enumerate(reader):
 
+		# Skip blank lines, as DictReader does
+		if not row:
+			continue
+
 		err_prefix = 'Error on row {}: '.format(i + 1)
 
+		# Missing values at end of row are empty
+		if len(row) < len(header):
+			row += [''] * (len(header) - len(row))
+
 		# Check file
-		path = row['file']
+		path = row[file_idx]
 		if not path.strip():
 			raise click.ClickException(err_prefix + 'invalid file')
 		elif not os.path.isfile(path):
@@ -151,15 +295,15 @@ def parse_import_csv(fh, db):
 			)
 
 		# Check compression
-		compression = import_str(row['compression'], lower=True)
+		compression = import_str(row[compression_idx], lower=True)
 		if compression not in [None, 'gzip']:
 			raise click.ClickException('Unknown compression type "{}"'
 			                           .format(compression))
 
 		# Get attributes from row
 		attrs = dict()
-		for attrname, converter in genome_import_attrs.iteritems():
-			val = row[attrname].strip()
+		for attrname, col_idx, converter in attr_converters:
+			val = row[col_idx].strip()
 
 			# Empty string is None
 			if not val:
@@ -190,6 +334,27 @@ def parse_import_csv(fh, db):
 				'Only "fasta" file_format is currently supported'
 			)
 
+		rows.append((err_prefix, path, compression, attrs))
+
+	# Find values of unique columns already in database, with one query per
+	# column instead of one per row
+	db_vals = dict()
+	for uq_col in uq_genome_import_attrs:
+		column = getattr(Genome, uq_col)
+		vals = list(set(attrs[uq_col] for _, _, _, attrs in rows
+		                if attrs[uq_col] is not None))
+
+		# Query in batches to stay under SQLite's limit on bound parameters
+		db_vals[uq_col] = set()
+		for start in range(0, len(vals), 500):
+			query = session.query(column).filter(
+				column.in_(vals[start:start + 500]))
+			db_vals[uq_col].update(val for val, in query)
+
+	session.close()
+
+	for err_prefix, path, compression, attrs in rows:
+
 		# Check uniqueness of columns
 		attrs_ok = True
 		for uq_col in uq_genome_import_attrs:
@@ -198,10 +363,7 @@ def parse_import_csv(fh, db):
 				continue
 
 			# Check already in database
-			found = (session.query(Genome)
-			                .filter_by(**{uq_col: val})
-			                .first())
-			if found is not None:
+			if val in db_vals[uq_col]:
 				click.echo(
 					err_prefix + 
 					'Reference genome already exists in database with '
@@ -269,22 +431,30 @@ def list(ctx, db, dest, out_csv=False):
 @click.argument('dest', type=click.File('w'), default='-')
 @with_db()
 def list_sets(ctx, db, dest, out_csv=False):
-	from wgskmers.database.models import GenomeSet
+	from sqlalchemy import func
+	from wgskmers.database.models import GenomeSet, genome_set_assoc
 
 	session = db.get_session()
-	gsets = session.query(GenomeSet).all()
 
 	if out_csv:
 
 		writer = DictWriter(dest, ['id', 'name', 'genome_count'])
 		writer.writeheader()
 
-		for gset in gsets:
-			writer.writerow(dict(id=gset.id, name=gset.name,
-			                genome_count=gset.genomes.count()))
+		# Get genome counts for all sets in a single query
+		query = (
+			session.query(GenomeSet.id, GenomeSet.name,
+			              func.count(genome_set_assoc.c.genome_id))
+			.outerjoin(genome_set_assoc,
+			           genome_set_assoc.c.set_id == GenomeSet.id)
+			.group_by(GenomeSet.id)
+		)
+
+		for id_, name, genome_count in query:
+			writer.writerow(dict(id=id_, name=name, genome_count=genome_count))
 
 	else:
-		for gset in gsets:
+		for gset in session.query(GenomeSet).all():
 			click.echo('({0.id}) {0.name}'.format(gset))
 
 
@@ -325,6 +495,7 @@ def make_set(ctx, db, name, description=None):
 @click.argument('directory', type=click.Path(exists=True))
 @with_db(confirm=True)
 def import_genomes(ctx, db, directory, **kwargs):
+	from tqdm import tqdm
 	from wgskmers.database.models import GenomeSet
 	from wgskmers.parse import find_seq_files
 
@@ -359,7 +530,6 @@ def import_genomes(ctx, db, directory, **kwargs):
 			csv_out = os.path.join(directory, 'genomes-import.csv')
 
 		# Find fasta files in directory
-		directory = os.path.abspath(directory)
 		files_info = find_seq_files(
 			directory,
 			filter_ext=True,
@@ -371,24 +541,55 @@ def import_genomes(ctx, db, directory, **kwargs):
 			tqdm=dict(desc='Finding sequence files')
 		)
 
+		# Make sure it's a supported format
+		files_info = [info for info in files_info if info.seq_format == 'fasta']
+		cache_keys = map(fasta_attrs_cache_key, files_info)
+
+		# Attributes guessed for the same files in previous runs. Only open
+		# files which have changed since last time.
+		attrs_cache = load_fasta_attrs_cache()
+		to_guess = [(key, info) for key, info in zip(cache_keys, files_info)
+		            if key not in attrs_cache]
+
+		# Guess attributes, reading files in parallel
+		if len(to_guess) > 1:
+			import multiprocessing as mp
+
+			pool = mp.Pool()
+			try:
+				guessed = pool.imap(guess_fasta_attrs,
+				                    [info for key, info in to_guess],
+				                    chunksize=4)
+				guessed = tqdm(guessed, total=len(to_guess),
+				               desc='Checking files')
+
+				for (key, info), attrs in zip(to_guess, guessed):
+					attrs_cache[key] = attrs
+
+				pool.close()
+				pool.join()
+
+			finally:
+				pool.terminate()
+
+		else:
+			for key, info in to_guess:
+				attrs_cache[key] = guess_fasta_attrs(info)
+
 		# Write import .csv template
-		with open(csv_out, 'w') as fh:
+		with open(csv_out, 'w', import_csv_bufsize) as fh:
 
 			writer = DictWriter(fh, genome_import_cols)
 			writer.writeheader()
 
-			# Guess attributes
-			for info in tqdm(files_info, desc='Checking files'):
-
-				# Make sure it's a supported format
-				if info.seq_format != 'fasta':
-					continue
-
-				attrs = guess_fasta_attrs(info)
+			for key, info in zip(cache_keys, files_info):
+				attrs = dict(attrs_cache[key])
 				attrs['file'] = info.path
 				attrs['compression'] = info.compression
 				writer.writerow(attrs)
 
+		save_fasta_attrs_cache(attrs_cache, cache_keys)
+
 		# Open it if possible
 		click.launch(csv_out)
 
@@ -407,7 +608,7 @@ def import_genomes(ctx, db, directory, **kwargs):
 		click.confirm('Please confirm when you have finished editing',
 		              abort=True)
 
-		csv_fh = open(csv_out)
+		csv_fh = open(csv_out, 'r', import_csv_bufsize)
 
 	else:
 		csv_fh = existing
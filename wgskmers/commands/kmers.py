@@ -1,31 +1,58 @@
 """Commands for managed stored k-mer sets"""
 
-from itertools import izip
+from collections import namedtuple
 
 import click
-from tqdm import tqdm
 
 from .util import choose_db, with_db
 
 
+# Just the information about a stored genome that RefCalculator needs, sent
+# to worker processes instead of the Genome model instance
+GenomeTask = namedtuple('GenomeTask', ['path', 'compression', 'file_format',
+                                       'is_assembled'])
+
+
 class RefCalculator(object):
 
 	@classmethod
-	def init(cls, db, spec):
-		cls.db = db
+	def init(cls, spec):
 		cls.spec = spec
 
 	@classmethod
-	def calc_ref(cls, genome):
+	def calc_ref(cls, item):
+		"""Calculates k-mer vector for (index, GenomeTask) tuple
+
+		Returns the index along with the vector so results can be matched back
+		to their genomes when completed out of order. Errors are returned
+		instead of raised so that one bad genome doesn't stop the rest.
+		"""
 		from Bio import SeqIO
-		from wgskmers.parse import vec_from_records
+		from wgskmers.parse import (vec_from_records, vec_from_seqs,
+			iter_fasta_seqs)
+		from wgskmers.database import open_genome_file
+
+		index, genome = item
+
+		# If assembled, get boolean vector. Otherwise get counts (why not)
+		counts = not genome.is_assembled
 
-		with cls.db.open_genome(genome) as fh:
+		try:
+			with open_genome_file(genome.path, genome.compression) as fh:
 
-			records = SeqIO.parse(fh, genome.file_format)
+				# Read FASTA sequences directly, without SeqRecords
+				if genome.file_format == 'fasta':
+					seqs = iter_fasta_seqs(fh)
+					vec = vec_from_seqs(seqs, cls.spec, counts=counts)
 
-			# If assembled, get boolean vector. Otherwise get counts (why not)
-			return vec_from_records(records, cls.spec, counts=not genome.is_assembled)
+				else:
+					records = SeqIO.parse(fh, genome.file_format)
+					vec = vec_from_records(records, cls.spec, counts=counts)
+
+		except Exception as e:
+			return index, None, '{}: {}'.format(type(e).__name__, e)
+
+		return index, vec, None
 
 
 @click.group(name='refs',
@@ -43,14 +70,22 @@ def listc(ctx, db):
 
 	The ID of the collection is listed at the beginning of the line.
 	"""
-	from wgskmers.database.models import KmerSetCollection
+	from sqlalchemy import func
+	from wgskmers.database.models import KmerSetCollection, KmerSet
 
 	session = db.get_session()
-	for collection in session.query(KmerSetCollection).all():
+
+	# Get set counts for all collections in a single query
+	query = (
+		session.query(KmerSetCollection, func.count(KmerSet.genome_id))
+		.outerjoin(KmerSet, KmerSet.collection_id == KmerSetCollection.id)
+		.group_by(KmerSetCollection.id)
+	)
+
+	for collection, count in query:
 
 		attrs = {a: getattr(collection, a) for a
 		         in ['id', 'k', 'prefix', 'title']}
-		count = collection.kmer_sets.count()
 		click.echo(
 			'{id}: [{k} - {prefix}] "{title}" ({0} calculated sets)'
 			.format(count, **attrs)
@@ -120,7 +155,10 @@ def calc(ctx, db, collection_id):
 	beginning of the line).
 	"""
 	import multiprocessing as mp
+	import threading
+	from Queue import Queue
 
+	from tqdm import tqdm
 	from wgskmers.kmers import KmerSpec
 	import wgskmers.multiprocess as kmp
 	from wgskmers.database.models import Genome, KmerSet, KmerSetCollection
@@ -138,14 +176,29 @@ def calc(ctx, db, collection_id):
 
 	spec = KmerSpec(k=collection.k, prefix=collection.prefix)
 
-	# Get genomes not already calculated in collection
-	genome_query = session.query(Genome).filter(
+	# Get genomes not already calculated in collection. Only the columns
+	# needed are loaded, as plain tuples instead of model instances.
+	genome_query = session.query(
+		Genome.id,
+		Genome.description,
+		Genome.filename,
+		Genome.compression,
+		Genome.file_format,
+		Genome.is_assembled,
+	).filter(
 		~Genome.kmer_sets.any(KmerSet.collection == collection)
 	)
 	genomes = genome_query.all()
 
+	# Number of genomes already in collection
+	skipped = session.query(Genome).count() - len(genomes)
+
+	tasks = [GenomeTask(db.genome_path(g), g.compression, g.file_format,
+	                    g.is_assembled)
+	         for g in genomes]
+
 	# Create pool
-	init_args = (db, spec)
+	init_args = (spec,)
 	pool = mp.Pool(initializer=RefCalculator.init, initargs=init_args,
 	               maxtasksperchild=100)
 
@@ -153,29 +206,75 @@ def calc(ctx, db, collection_id):
 
 	try:
 
-		# Start the workers
-		results = pool.imap(RefCalculator.calc_ref, genomes)
+		# Send genomes to workers in chunks to reduce IPC overhead, but keep
+		# several chunks per process so the work stays balanced
+		chunksize = max(1, len(tasks) // (4 * mp.cpu_count()))
+
+		# Start the workers, getting results in order of completion so that
+		# a slow genome doesn't hold up storing the others
+		results = pool.imap_unordered(RefCalculator.calc_ref,
+		                              enumerate(tasks), chunksize=chunksize)
 		pool.close()
 
-		# Iterate through results
-		added, errors = 0, 0
-		for vec, genome in tqdm(izip(results, genomes), total=len(genomes)):
+		# Store sets in a background thread so that writing one doesn't hold up
+		# collecting the next results. Queue size limits the number of vectors
+		# kept in memory while waiting.
+		store_queue = Queue(maxsize=2 * mp.cpu_count())
+		store_counts = dict(added=0, errors=0)
+
+		def store_results():
+			while True:
+				item = store_queue.get()
+				if item is None:
+					return
+
+				vec, genome = item
+
+				# Try adding the set
+				try:
+					store_set(vec, genome, has_counts=not genome.is_assembled)
+					store_counts['added'] += 1
+
+				# Print exception and continue
+				except Exception as e:
+					click.secho(
+						'Error finding k-mers for genome "{}": {}'
+						.format(genome.description, e),
+						err=True, fg='red'
+					)
+					store_counts['errors'] += 1
+
+		store_thread = threading.Thread(target=store_results)
+		store_thread.daemon = True
+		store_thread.start()
 
-			# Try adding the set
-			try:
-				store_set(vec, genome, has_counts=not genome.is_assembled)
-				added += 1
+		# Iterate through results
+		calc_errors = 0
+		for index, vec, error in tqdm(results, total=len(genomes)):
+			genome = genomes[index]
 
-			# Print exception and continue
-			except Exception as e:
+			if error is not None:
 				click.secho(
 					'Error finding k-mers for genome "{}": {}'
-					.format(genome.description, e),
+					.format(genome.description, error),
 					err=True, fg='red'
 				)
-				errors += 1
+				calc_errors += 1
+				continue
+
+			store_queue.put((vec, genome))
+
+		# Let workers exit normally (terminate() below is then a no-op, and
+		# only actually kills workers if we got here through an exception)
+		pool.join()
+
+		# Wait for remaining sets to be stored
+		store_queue.put(None)
+		store_thread.join()
+
+		added = store_counts['added']
+		errors = calc_errors + store_counts['errors']
 
-		skipped = session.query(Genome).count() - added - errors
 		click.echo(
 			'Calculated {} sets, {} errors, {} already in collection'
 			.format(added, errors, skipped)
@@ -3,10 +3,55 @@
 import os
 from functools import wraps
 from textwrap import dedent
+from importlib import import_module
 
 import click
 
 
+class LazyGroup(click.Group):
+	"""Click group which only imports subcommand modules when they are needed
+
+	Takes an additional lazy_subcommands argument, a dict mapping command
+	names to (module_name, attribute_name, short_help) tuples. The short help
+	strings are used when listing commands in the group's help page, so that
+	doesn't require importing anything either.
+	"""
+
+	def __init__(self, *args, **kwargs):
+		self.lazy_subcommands = kwargs.pop('lazy_subcommands', {})
+		super(LazyGroup, self).__init__(*args, **kwargs)
+
+	def list_commands(self, ctx):
+		names = super(LazyGroup, self).list_commands(ctx)
+		return sorted(set(names).union(self.lazy_subcommands))
+
+	def get_command(self, ctx, name):
+		if name in self.lazy_subcommands:
+			return self._load_command(name)
+		return super(LazyGroup, self).get_command(ctx, name)
+
+	def format_commands(self, ctx, formatter):
+		rows = []
+		for name in self.list_commands(ctx):
+			if name in self.lazy_subcommands:
+				short_help = self.lazy_subcommands[name][2]
+			else:
+				cmd = self.get_command(ctx, name)
+				if cmd is None:
+					continue
+				short_help = cmd.short_help or ''
+
+			rows.append((name, short_help))
+
+		if rows:
+			with formatter.section('Commands'):
+				formatter.write_dl(rows)
+
+	def _load_command(self, name):
+		module_name, attr, short_help = self.lazy_subcommands[name]
+		return getattr(import_module(module_name), attr)
+
+
 def choose_db(pass_opts=False, pass_context=False):
 	"""Decorator for a command/group that chooses a database to work with
 
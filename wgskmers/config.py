@@ -7,6 +7,7 @@ from appdirs import AppDirs
 
 app_dirs = AppDirs('wgskmers', version='0.2')
 config_dir = app_dirs.user_config_dir
+cache_dir = app_dirs.user_cache_dir
 
 
 # Don't load until requested
@@ -18,6 +19,7 @@ def config_exists():
 
 
 def get_config():
+	"""Get the system configuration, only loading it on the first call"""
 	if _config is None:
 		reload_config()
 	return _config
@@ -58,7 +60,7 @@ class SystemConfig(object):
 		return self._db_conf
 
 	def _save_db_conf(self, conf):
-		self. db_conf = conf
+		self._db_conf = conf
 		with open(self._path_for('databases'), 'w') as fh:
 			json.dump(conf, fh)
 
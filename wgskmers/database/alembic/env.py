@@ -1,6 +1,7 @@
 from __future__ import with_statement
 from alembic import context
 from sqlalchemy import engine_from_config, pool
+from sqlalchemy.event import listen
 from logging.config import fileConfig
 
 # this is the Alembic Config object, which provides
@@ -16,6 +17,7 @@ fileConfig(config.config_file_name)
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from wgskmers.database import Base
+from wgskmers.database.sqla import set_sqlite_pragmas
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -59,6 +61,7 @@ def run_migrations_online():
         config.get_section(config.config_ini_section),
         prefix='sqlalchemy.',
         poolclass=pool.NullPool)
+    listen(connectable, 'connect', set_sqlite_pragmas)
 
     with connectable.connect() as connection:
         context.configure(
@@ -36,6 +36,20 @@ DEFAULT_DB_PATH_VAR = 'KMERS_DEFAULT_DB_PATH'
 INFO_FILE_NAME = '.kmer-db'
 
 
+def open_genome_file(path, compression):
+	"""Open stored genome file given its path and compression"""
+
+	if compression is None:
+		return open(path)
+
+	elif compression == 'gzip':
+		return gzip.open(path, 'r')
+
+	else:
+		raise RuntimeError('Can\'t open genome with compression "{}"'
+		                   .format(compression))
+
+
 def is_db_directory(path):
 	"""Checks if a directory contains a k-mer database"""
 	return os.path.isfile(os.path.join(path, INFO_FILE_NAME))
@@ -308,18 +322,12 @@ class Database(object):
 		finally:
 			session.close()
 
-	def open_genome(self, genome):
-		path = self._get_path('genomes', genome.filename)
+	def genome_path(self, genome):
+		"""Get path to stored genome file"""
+		return self._get_path('genomes', genome.filename)
 
-		if genome.compression is None:
-			return open(path)
-
-		elif genome.compression == 'gzip':
-			return gzip.open(path, 'r')
-
-		else:
-			raise RuntimeError('Can\'t open genome with compression "{}"'
-			                   .format(genome.compression))
+	def open_genome(self, genome):
+		return open_genome_file(self.genome_path(genome), genome.compression)
 
 	def create_kmer_collection(self, **kwargs):
 
@@ -385,6 +393,12 @@ class Database(object):
 			for relpath in cls._rel_paths.values():
 				rmpath(os.path.join(directory, relpath))
 
+			# Also remove SQLite journal files, which must never be paired
+			# with the new database file
+			sqlite_path = os.path.join(directory, cls._rel_paths['sqlite'])
+			for suffix in ('-wal', '-shm', '-journal'):
+				rmpath(sqlite_path + suffix)
+
 		elif os.listdir(directory):
 			raise RuntimeError('{} exists and is not empty'.format(directory))
 
@@ -43,6 +43,20 @@ class TrackChangesMixin(object):
 		listen(cls, 'before_update', cls.update_time_callback)
 
 
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+	"""SQLAlchemy engine "connect" event listener configuring SQLite
+
+	Used for the alembic commands only. Enables write-ahead logging so that
+	readers don't block while the database is being migrated, and sets a
+	busy timeout so that connections wait for locks to be released instead
+	of failing immediately.
+	"""
+	cursor = dbapi_connection.cursor()
+	cursor.execute('PRAGMA journal_mode=WAL')
+	cursor.execute('PRAGMA busy_timeout=5000')
+	cursor.close()
+
+
 # Python types corresponding to non-collection types storable in JSON
 jsonable_scalars = (int, long, float, basestring, bool, type(None))
 
@@ -9,10 +9,12 @@ be upper case.
 """
 
 import collections
+import string
 
 import numpy as np
 
 from Bio.Seq import Seq
+from Bio.Data.IUPACData import ambiguous_dna_complement
 
 
 # The four DNA nucleotides.
@@ -22,6 +24,19 @@ nucleotides = sorted('ACGT')
 # Dict mapping each nucleotide to its index in the above order
 nucleotide_indices = dict((n, i) for i, n in enumerate(nucleotides))
 
+# Lookup table mapping byte values to nucleotide indices, for use with numpy.
+# Bytes which aren't one of the nucleotides map to 4.
+nucleotide_index_table = np.full(256, 4, dtype=np.uint8)
+for n, i in nucleotide_indices.items():
+	nucleotide_index_table[ord(n)] = i
+
+# Translation table for complementing str sequences, same mapping as Biopython
+complement_table = string.maketrans(
+	''.join(ambiguous_dna_complement) + ''.join(ambiguous_dna_complement).lower(),
+	''.join(ambiguous_dna_complement.values()) +
+	''.join(ambiguous_dna_complement.values()).lower()
+)
+
 
 def reverse_compliment(seq):
 	"""A quick way of getting the reverse compliment of a sequence
@@ -35,7 +50,23 @@ def reverse_compliment(seq):
 	if isinstance(seq, Seq):
 		return seq.reverse_complement()
 	else:
-		return str(Seq(seq).reverse_complement())
+		return str(seq).translate(complement_table)[::-1]
+
+
+def seq_upper(seq):
+	"""Converts a sequence to an upper case str
+
+	Sequences are usually upper case already, in which case they are returned
+	as-is instead of being copied.
+
+	Args:
+		seq: str|Bio.Seq.Seq. Sequence to convert.
+
+	Returns:
+		str.
+	"""
+	seq = str(seq)
+	return seq if seq.isupper() else seq.upper()
 
 
 def kmer_index(kmer):
@@ -72,6 +103,49 @@ def kmer_at_index(index, k):
 	return ''.join(reversed(nucs_reversed))
 
 
+def kmer_index_array(seq, locs, k):
+	"""Vectorized version of kmer_index() for k-mers in a sequence
+
+	Args:
+		seq: str. Sequence containing the k-mers.
+		locs: np.ndarray. Start index of each k-mer within seq.
+		k: int. Length of k-mers.
+
+	Returns:
+		np.ndarray. Indices of k-mers as np.int64. K-mers containing
+			characters other than the four nucleotides are omitted.
+	"""
+	seq_array = np.frombuffer(str(seq), dtype=np.uint8)
+	locs = np.asarray(locs, dtype=np.intp)
+
+	# Nucleotide indices of each k-mer as rows of 2d array
+	nuc_idx = nucleotide_index_table[seq_array[locs[:, None] + np.arange(k)]]
+	nuc_idx = nuc_idx[(nuc_idx < 4).all(axis=1)]
+
+	shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.int64)
+	return (nuc_idx.astype(np.int64) << shifts).sum(axis=1)
+
+
+def kmers_at_indices(indices, k):
+	"""Vectorized version of kmer_at_index()
+
+	Args:
+		indices: np.ndarray. Indices of k-mers to get.
+		k: int. Length of k-mers.
+
+	Returns:
+		np.ndarray. K-mers at indices, as byte strings of length k.
+	"""
+	indices = np.asarray(indices, dtype=np.int64)
+	nuc_bytes = np.frombuffer(''.join(nucleotides), dtype=np.uint8)
+
+	chars = np.empty((len(indices), k), dtype=np.uint8)
+	for i in range(k):
+		chars[:, k - i - 1] = nuc_bytes[(indices >> (2 * i)) & 3]
+
+	return chars.view('S{}'.format(k)).ravel()
+
+
 def locate_kmers(seq, k, prefix):
 	"""Generator that finds locations of k-mers in sequence
 
@@ -94,6 +168,44 @@ def locate_kmers(seq, k, prefix):
 			break
 
 
+def locate_kmers_array(seq, k, prefix):
+	"""Vectorized version of locate_kmers()
+
+	Compares the first character of the prefix against the entire sequence
+	at once, then checks the remaining characters only at the candidate
+	locations that matched.
+
+	Args:
+		seq: str|Bio.Seq.Seq. Sequence to search within.
+		k: int. Length of k-mers to find, including prefix.
+		prefix: str|np.ndarray. Finds k-mers beginning with this subsequence.
+			May also be given as an array of its bytes (np.uint8).
+
+	Returns:
+		np.ndarray. Start index of each match (beginning of prefix), in
+			increasing order.
+	"""
+	seq_array = np.frombuffer(str(seq), dtype=np.uint8)
+	if isinstance(prefix, np.ndarray):
+		prefix_array = prefix
+	else:
+		prefix_array = np.frombuffer(str(prefix), dtype=np.uint8)
+
+	# Matches must end before the same point as in locate_kmers()
+	end = len(seq_array) - k - len(prefix_array) + 1
+	if end <= 0:
+		return np.empty(0, dtype=np.intp)
+
+	if len(prefix_array) == 0:
+		return np.arange(end, dtype=np.intp)
+
+	locs = np.flatnonzero(seq_array[:end] == prefix_array[0])
+	for i in range(1, len(prefix_array)):
+		locs = locs[seq_array[locs + i] == prefix_array[i]]
+
+	return locs
+
+
 def vec_to_coords(vec, counts=False, out=None, dtype=np.int64):
 	"""Convert to compressed coordinate representation"""
 	coords, = np.nonzero(vec)
@@ -157,6 +269,10 @@ class KmerSpec(object):
 		self.k_sfx = self.k - self.plen
 		self.idx_len = 4 ** self.k_sfx
 
+		# Prefix bytes for locate_kmers_array(), computed once instead of for
+		# every sequence searched
+		self._prefix_array = np.frombuffer(self.prefix, dtype=np.uint8)
+
 	def find(self, seq, **kwargs):
 		"""Creates KmerFinder based on this spec that finds k-mers in sequence.
 
@@ -240,6 +356,24 @@ class KmerFinder(object):
 			if set(kmer).issubset(nucleotides):
 				yield kmer_index(kmer)
 
+	def get_index_array(self):
+		"""Gets indices of all k-mers found in the sequence as an array.
+
+		Vectorized version of get_indices(), much faster for long sequences.
+
+		Returns:
+			np.ndarray. Indices of each found k-mer as np.int64, in the same
+				order as yielded by get_indices().
+		"""
+		arrays = [kmer_index_array(seq, locs, self.spec.k_sfx)
+		          for seq, locs in self._get_suffix_locs(revcomp=False)]
+
+		if self.find_revcomp:
+			arrays.extend(kmer_index_array(seq, locs, self.spec.k_sfx)
+			              for seq, locs in self._get_suffix_locs(revcomp=True))
+
+		return np.concatenate(arrays)
+
 	def bool_vec(self, out=None, dtype=np.bool):
 		"""Creates boolean vector indicating indices of k-mers found.
 
@@ -257,8 +391,7 @@ class KmerFinder(object):
 		if out is None:
 			out = np.zeros(self.spec.idx_len, dtype=dtype)
 
-		for index in self.get_indices():
-			out[index] = True
+		out[self.get_index_array()] = True
 
 		return out
 
@@ -280,14 +413,13 @@ class KmerFinder(object):
 		if out is None:
 			out = np.zeros(self.spec.idx_len, dtype=dtype)
 
-		try:
-			old_err = np.seterr(over='raise')
-
-			for index in self.get_indices():
-				out[index] += 1
+		indices, counts = np.unique(self.get_index_array(), return_counts=True)
 
-		finally:
-			np.seterr(**old_err)
+		# Check for overflow, raising the same error numpy would
+		new_counts = out[indices] + counts
+		out[indices] = new_counts
+		if np.any(out[indices] != new_counts):
+			raise FloatingPointError('overflow encountered in k-mer counts')
 
 		return out
 
@@ -311,6 +443,29 @@ class KmerFinder(object):
 			for loc in locate_kmers(wrap_seq, self.spec.k, self.spec.prefix):
 				yield wrap_seq[loc + self.spec.plen : loc + self.spec.k]
 
+	def _get_suffix_locs(self, revcomp=False):
+		"""Internal generator yielding sequences along with arrays of the start
+		locations of k-mer suffixes within them.
+		"""
+
+		if revcomp:
+			seq = str(reverse_compliment(self.seq))
+		else:
+			seq = str(self.seq)
+
+		# Forward direction as a linear sequence
+		yield seq, self._locate_suffixes(seq)
+
+		# Account for circular sequences
+		if self.seq_circular:
+			wrap_seq = seq[-(self.spec.k-1):] + seq[:(self.spec.k-1)]
+			yield wrap_seq, self._locate_suffixes(wrap_seq)
+
+	def _locate_suffixes(self, seq):
+		"""Gets array of start locations of k-mer suffixes in sequence"""
+		locs = locate_kmers_array(seq, self.spec.k, self.spec._prefix_array)
+		return locs + self.spec.plen
+
 
 class QualityKmerFinder(KmerFinder):
 	"""Finds and extracts k-mers from a sequence with quality scores.
@@ -370,6 +525,36 @@ class QualityKmerFinder(KmerFinder):
 				if min(wrap_qual[s]) >= self.threshold:
 					yield wrap_seq[s]
 
+	def _get_suffix_locs(self, revcomp=False):
+		"""Internal generator yielding sequences along with arrays of the start
+		locations of k-mer suffixes within them.
+		"""
+
+		if revcomp:
+			seq = str(reverse_compliment(self.seq))
+			qual = np.asarray(self.quality)[::-1]
+		else:
+			seq = str(self.seq)
+			qual = np.asarray(self.quality)
+
+		# Forward direction as a linear sequence
+		locs = self._locate_suffixes(seq)
+		yield seq, locs[self._quality_ok(qual, locs)]
+
+		# Account for circular sequences
+		if self.seq_circular:
+			wrap_seq = seq[-(self.spec.k-1):] + seq[:(self.spec.k-1)]
+			wrap_qual = np.concatenate([qual[-(self.spec.k-1):],
+			                            qual[:(self.spec.k-1)]])
+
+			locs = self._locate_suffixes(wrap_seq)
+			yield wrap_seq, locs[self._quality_ok(wrap_qual, locs)]
+
+	def _quality_ok(self, qual, locs):
+		"""Boolean mask of k-mer suffix locations meeting quality threshold"""
+		windows = qual[locs[:, None] + np.arange(self.spec.k_sfx)]
+		return windows.min(axis=1) >= self.threshold
+
 
 class KmerCoordsCollection(collections.Sequence):
 	"""Stores a collection of k-mer sets in coordinate format in a single array"""
@@ -7,6 +7,7 @@ import numpy as np
 from Bio import SeqIO
 from tqdm import tqdm
 
+from wgskmers.kmers import seq_upper
 from wgskmers.util import kwargs_finished
 
 
@@ -17,6 +18,14 @@ seq_file_exts = [
 ]
 seq_file_exts = {ext: fmt for exts, fmt in seq_file_exts for ext in exts}
 
+# ASCII offsets of PHRED quality scores in FASTQ formats readable by
+# iter_fastq_reads() (Solexa scores aren't PHRED, so aren't included)
+fastq_quality_offsets = {
+	'fastq': 33,
+	'fastq-sanger': 33,
+	'fastq-illumina': 64,
+}
+
 
 # Named tuple to store info inferred from file
 class SeqFileInfo(object):
@@ -142,7 +151,9 @@ def find_seq_files(directory, **kwargs):
 		         for dirpath, dirnames, filenames in os.walk(directory)
 		         for fn in filenames)
 	else:
-		paths = (f for f in os.listdir(directory) if os.path.isfile(f))
+		paths = (os.path.join(directory, fn)
+		         for fn in sorted(os.listdir(directory)))
+		paths = (path for path in paths if os.path.isfile(path))
 
 	# Show progress
 	if tqdm_args is True:
@@ -198,23 +209,59 @@ def vec_from_records(records, spec, counts=False, **kwargs):
 	out = kwargs.pop('out', None)
 	kwargs_finished(kwargs)
 
-	buf = out if counts or c_threshold is None else None
+	def get_finders():
+		for record in records:
+
+			# Upper case for search
+			seq = seq_upper(record.seq)
 
-	# Parse file and iterate over sequences
-	for record in records:
+			# No quality
+			if q_threshold is None:
+				yield spec.find(seq, revcomp=True)
 
-		# Upper case for search
-		seq = record.seq.upper()
+			# With quality info
+			else:
+				phred_scores = record.letter_annotations['phred_quality']
+				yield spec.find_quality(seq, revcomp=True,
+				                        quality=phred_scores,
+				                        threshold=q_threshold)
 
-		# No quality
-		if q_threshold is None:
-			finder = spec.find(seq, revcomp=True)
+	return _vec_from_finders(get_finders(), counts, c_threshold, out)
 
-		# With quality info
-		else:
-			phred_scores = record.letter_annotations['phred_quality']
-			finder = spec.find_quality(seq, revcomp=True, quality=phred_scores,
-			                           threshold=q_threshold)
+
+def vec_from_seqs(seqs, spec, counts=False, **kwargs):
+	"""Create a k-mer vector from a set of plain sequence strings.
+
+	Like vec_from_records(), but for sequences read without Bio.SeqIO (e.g.
+	by iter_fasta_seqs()). Quality scores are not supported.
+
+	Args:
+		seqs: iterable of str. Sequences to find k-mers in.
+		spec. KmerSpec. Spec defining k-mers to search for.
+		counts: bool. Get k-mer counts instead of boolean vector.
+
+	kwargs:
+		c_threshold: int|None. If not None, return boolean vector of k-mers
+			occurring at least this many times.
+		out: np.ndarray|None. Array to write output to.
+
+	Returns:
+		np.ndarray.
+	"""
+	c_threshold = kwargs.pop('c_threshold', None)
+	out = kwargs.pop('out', None)
+	kwargs_finished(kwargs)
+
+	finders = (spec.find(seq_upper(seq), revcomp=True) for seq in seqs)
+	return _vec_from_finders(finders, counts, c_threshold, out)
+
+
+def _vec_from_finders(finders, counts, c_threshold, out):
+	"""Accumulates k-mer vector for vec_from_records() and vec_from_seqs()"""
+
+	buf = out if counts or c_threshold is None else None
+
+	for finder in finders:
 
 		# Get kmer vectors
 		if counts or c_threshold is not None:
@@ -266,6 +313,88 @@ def parse_to_array(files, spec, out=None, **kwargs):
 	return out
 
 
+def iter_fasta_seqs(fh):
+	"""Generator yielding sequences in a FASTA file as plain strings.
+
+	Much faster than Bio.SeqIO.parse when only the sequences themselves are
+	needed, as no SeqRecord objects are created.
+
+	Args:
+		fh: file-like object. FASTA file opened in text mode.
+
+	Yields:
+		str. Sequence of each record in file, as written (not converted to
+			upper case).
+	"""
+	seq_lines = None
+
+	for line in fh:
+		if line.startswith('>'):
+			if seq_lines is not None:
+				yield ''.join(seq_lines)
+			seq_lines = []
+
+		# Ignore anything before the first header, like SeqIO does
+		elif seq_lines is not None:
+			seq_lines.append(line.strip())
+
+	if seq_lines is not None:
+		yield ''.join(seq_lines)
+
+
+def iter_fastq_reads(fh):
+	"""Generator yielding sequences and quality strings in a FASTQ file.
+
+	Much faster than Bio.SeqIO.parse, as no SeqRecord objects or lists of
+	quality scores are created. Quality strings are returned as written, use
+	fastq_quality_offsets to convert them to PHRED scores.
+
+	Args:
+		fh: file-like object. FASTQ file opened in text mode.
+
+	Yields:
+		tuple (str, str). Sequence and quality string of each read, as written
+			(not converted to upper case).
+	"""
+	lines = iter(fh)
+
+	for header in lines:
+		header = header.strip()
+		if not header:
+			continue
+		if not header.startswith('@'):
+			raise ValueError('Expected FASTQ header, got {!r}'.format(header))
+
+		# Sequence may be wrapped over multiple lines, ended by "+" line
+		seq_lines = []
+		for line in lines:
+			if line.startswith('+'):
+				break
+			seq_lines.append(line.strip())
+		else:
+			raise ValueError('Unexpected end of FASTQ file')
+		seq = ''.join(seq_lines)
+
+		# Quality lines until same length as sequence (can't look for the next
+		# header as quality strings may begin with "@")
+		qual_lines = []
+		qual_len = 0
+		while qual_len < len(seq):
+			line = next(lines, None)
+			if line is None:
+				raise ValueError('Unexpected end of FASTQ file')
+			line = line.strip()
+			qual_lines.append(line)
+			qual_len += len(line)
+		qual = ''.join(qual_lines)
+
+		if len(qual) != len(seq):
+			raise ValueError('Sequence and quality lengths differ in read {}'
+			                 .format(header[1:]))
+
+		yield seq, qual
+
+
 class ProgressSeqParser(object):
 	"""Wraps generator from Bio.SeqIO.parse with tqdm progress bar."""
 
@@ -24,6 +24,7 @@ class QueryMetric(object):
 		self._nb_array_funcs = dict()
 		self._nb_coords_single = None
 		self._nb_coords_vectorized = None
+		self._intersection_func = None
 
 		self.return_type = np.dtype(return_type)
 		self.is_distance = is_distance
@@ -102,6 +103,24 @@ class QueryMetric(object):
 		# Return output array in original shape
 		return out
 
+	@property
+	def has_intersection_func(self):
+		return self._intersection_func is not None
+
+	def from_intersection(self, query_size, ref_size, intersection):
+		"""Evaluate the metric given only the sizes of the two sets and of
+		their intersection.
+
+		Allows several metrics to be calculated from a single pass over the
+		coordinates of the two sets (see coords_intersection()).
+		"""
+		return self._intersection_func(query_size, ref_size, intersection)
+
+	def intersection_func(self, func):
+		"""Decorator to register function for from_intersection()"""
+		self._intersection_func = func
+		return func
+
 	def nb_array_func(self, *args, **kwargs):
 		"""Creates decorator to register the numba guvectorized array function"""
 
@@ -171,6 +190,33 @@ class QueryMetric(object):
 		return self._nb_coords_single
 
 
+@nb.jit(nopython=True)
+def coords_intersection(query, ref):
+	"""Size of intersection of two sets in (sorted) coordinate format"""
+
+	N = query.shape[0]
+	M = ref.shape[0]
+
+	intersection = 0
+
+	i = 0
+	j = 0
+	while i < N and j < M:
+		q = query[i]
+		r = ref[j]
+
+		if q == r:
+			intersection += 1
+
+		if q <= r:
+			i += 1
+
+		if r <= q:
+			j += 1
+
+	return intersection
+
+
 query_metrics = dict()
 
 def metric(*args, **kwargs):
@@ -226,6 +272,10 @@ def coords_hamming(query, ref):
 
 	return dist
 
+@hamming.intersection_func
+def intersection_hamming(query_size, ref_size, intersection):
+	return query_size + ref_size - 2 * intersection
+
 
 ##### Jaccard Index #####
 
@@ -284,6 +334,11 @@ def coords_jaccard(query, ref):
 
 	return nb.float32(N + M - union) / union
 
+@jaccard.intersection_func
+def intersection_jaccard(query_size, ref_size, intersection):
+	return (np.float32(intersection) /
+	        (query_size + ref_size - intersection))
+
 
 ##### Asymmetrical Jaccard #####
 
@@ -340,6 +395,10 @@ def coords_asym_jacc(query, ref):
 
 	return nb.float32(intersection) / M
 
+@asym_jacc.intersection_func
+def intersection_asym_jacc(query_size, ref_size, intersection):
+	return np.float32(intersection) / ref_size
+
 
 ##### Parallelized query functions #####
 
@@ -431,9 +490,21 @@ class CoordsQueryWorker(object):
 
 		ref_coords = cls.loader.load_coords(ref_set)
 
-		for k, metric in enumerate(cls.metrics):
+		# Calculate all metrics from a single pass over the coordinates for
+		# each query if possible, instead of one pass per metric
+		if all(metric.has_intersection_func for metric in cls.metrics):
 			for j, query_coords in enumerate(cls.query_coords):
-				cls.dest[k, ref_idx, j] = metric.coords(query_coords, ref_coords)
+				intersection = coords_intersection(query_coords, ref_coords)
+
+				for k, metric in enumerate(cls.metrics):
+					cls.dest[k, ref_idx, j] = metric.from_intersection(
+						len(query_coords), len(ref_coords), intersection)
+
+		else:
+			for k, metric in enumerate(cls.metrics):
+				for j, query_coords in enumerate(cls.query_coords):
+					cls.dest[k, ref_idx, j] = metric.coords(query_coords,
+					                                        ref_coords)
 
 
 def mp_query_coords(query, db, collection, ref_sets, metrics, **kwargs):
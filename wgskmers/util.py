@@ -1,8 +1,11 @@
 """Misc utility functions for the project"""
 
 import os
+import sys
 import shutil
 import itertools
+import threading
+from collections import deque
 
 
 def rmpath(path):
@@ -26,16 +29,124 @@ def kwargs_finished(kwargs):
 		raise TypeError('Unknown keyword argument {}'.format(repr(kwargs.keys()[0])))
 
 
-def iterator_empty(iterator):
+# Sentinel value for iterator_empty()
+_no_value = object()
+
+
+def iterator_empty(iterable):
 	"""Checks if an iterator is empty, also returning a substitute iterator.
 
 	Consumes first element of iterator, but stores it for the substitute
-	iterator to yield first.
+	iterator to yield first (so it is only ever produced once).
 	"""
+	iterator = iter(iterable)
+
+	first = next(iterator, _no_value)
+	if first is _no_value:
+		return iter([]), True
+	else:
+		return itertools.chain([first], iterator), False
+
+
+def iter_prefetch(iterable, chunk_size=1 << 20, max_size=8 << 20,
+                  size_func=len):
+	"""Iterates over an iterable while reading ahead in a background thread.
+
+	Useful when producing the items involves I/O, so that reading can be
+	overlapped with processing the items in the calling thread. Items are
+	passed between threads in chunks to reduce the overhead of locking.
+
+	The amount read ahead is bounded by the total size of the items (as
+	determined by size_func), not their number, so that files containing
+	a few very large sequences are not read into memory all at once. The
+	background thread is stopped and joined when the generator is closed
+	or exhausted, so the underlying file can safely be closed afterwards.
+
+	Args:
+		iterable: iterable. Items to iterate over.
+		chunk_size: int. Items are passed to the calling thread once their
+			total size reaches this value.
+		max_size: int. Stop reading ahead once the total size of items not
+			yet passed to the calling thread reaches this value.
+		size_func: callable. Function returning the size of an item, e.g. the
+			length of a sequence.
+
+	Yields:
+		Items from iterable, in the same order. Exceptions raised while
+		iterating are re-raised in the calling thread.
+	"""
+	cond = threading.Condition()
+	chunks = deque()
+	stop = threading.Event()
+	state = dict(queued_size=0)
+
+	def put(chunk, size, exc_info=None, wait=True):
+		with cond:
+			while wait and state['queued_size'] >= max_size \
+					and not stop.is_set():
+				cond.wait()
+
+			if stop.is_set():
+				return False
+
+			chunks.append((chunk, size, exc_info))
+			state['queued_size'] += size
+			cond.notify_all()
+			return True
+
+	def produce():
+		try:
+			chunk = []
+			chunk_total = 0
+			for item in iterable:
+				if stop.is_set():
+					return
+
+				chunk.append(item)
+				chunk_total += size_func(item)
+
+				if chunk_total >= chunk_size:
+					if not put(chunk, chunk_total):
+						return
+					chunk = []
+					chunk_total = 0
+
+			if chunk and not put(chunk, chunk_total):
+				return
+			put(None, 0, wait=False)
+
+		except Exception:
+			put(None, 0, sys.exc_info(), wait=False)
+
+	# Daemon thread so an abandoned iteration doesn't keep the process alive
+	thread = threading.Thread(target=produce)
+	thread.daemon = True
+	thread.start()
 
 	try:
-		first = [next(iterator)]
-		return itertools.chain(first, iterator), False
+		while True:
+			with cond:
+				while not chunks:
+					cond.wait()
 
-	except StopIteration:
-		return iter([]), True
+				chunk, size, exc_info = chunks.popleft()
+				state['queued_size'] -= size
+				cond.notify_all()
+
+			if exc_info is not None:
+				raise exc_info[0], exc_info[1], exc_info[2]
+			elif chunk is None:
+				return
+
+			for item in chunk:
+				yield item
+
+	finally:
+		# Signal thread to stop, discard anything read ahead and wait for it
+		# to finish with the iterable
+		with cond:
+			stop.set()
+			chunks.clear()
+			cond.notify_all()
+
+		thread.join()